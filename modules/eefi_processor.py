@@ -6,12 +6,18 @@
 
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
+import mmap
 import re
 import logging
 
+from utils.file_utils import linhas_mmap
+
 logger = logging.getLogger("splitter")
 logger.setLevel(logging.INFO)
 
+# Fallback de PV: primeiro bloco de 9 dígitos (compilada uma vez)
+_PV_RE = re.compile(r"\d{9}")
+
 # -------------------------------------------------------------
 # Layout Posições (índices 0-based p/ slicing)
 # -------------------------------------------------------------
@@ -57,6 +63,12 @@ LAYOUT_POS = {
     },
 }
 
+# Tipos de detalhe roteados por PV e os que somam no trailer do filho
+TIPOS_DETALHE = frozenset({"040", "045", "034", "035", "036", "038", "043"})
+TIPOS_FINANCEIROS = frozenset({"034", "036", "043", "035", "038", "045"})
+# Mesmos tipos em bytes: linhas que precisam ser decodificadas no agrupamento
+_TIPOS_ROTEADOS_B = frozenset(t.encode("ascii") for t in TIPOS_DETALHE | {"032"})
+
 # -------------------------------------------------------------
 # Utils
 # -------------------------------------------------------------
@@ -82,6 +94,24 @@ def _write_money(line: str, rng: Tuple[int, int], value_cents: int) -> str:
     s = f"{value_cents:0>{width}}"
     return line[:rng[0]] + s + line[rng[1]:]
 
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="ignore")
+
+def _tem_tipo(mm: mmap.mmap, tipo: bytes) -> bool:
+    """Existe alguma linha começando com o tipo? (busca em C, sem varrer linha a linha)"""
+    return mm[:len(tipo)] == tipo or mm.find(b"\n" + tipo) != -1
+
+def _ultima_linha_tipo(mm: mmap.mmap, tipo: bytes) -> Optional[bytes]:
+    """Última linha que começa com o tipo (busca reversa a partir do fim)."""
+    pos = mm.rfind(b"\n" + tipo)
+    if pos != -1:
+        start = pos + 1
+    elif mm[:len(tipo)] == tipo:
+        start = 0
+    else:
+        return None
+    return next(linhas_mmap(mm, start))
+
 def _extract_pv(line: str, tipo: str) -> Optional[str]:
     """
     Tenta extrair o PV pelo layout do tipo; se falhar, tenta alternativas;
@@ -111,9 +141,9 @@ def _extract_pv(line: str, tipo: str) -> Optional[str]:
             return seg
 
     # 3) Fallback: pega o primeiro bloco de 9 dígitos perto do início
-    m = re.search(r"(\d{9})", line[:60])
+    m = _PV_RE.search(line, 0, 60)
     if m:
-        return m.group(1)
+        return m.group(0)
 
     return None
 
@@ -124,60 +154,65 @@ def process_eefi(file_path: str, output_root: str = "output") -> dict:
     try:
         logger.info(f"🟢 EEFI | arquivo={file_path}")
         src = Path(file_path)
-        lines = src.read_text(encoding="utf-8", errors="ignore").splitlines()
-        if not lines:
+        if src.stat().st_size == 0:
             raise ValueError("Arquivo vazio.")
 
-        header_030 = lines[0]
-        nsa = _slice(header_030, LAYOUT_POS["030"]["sequencia"])
-        data_emissao = _slice(header_030, LAYOUT_POS["030"]["data_emissao"])
-
-        tem_032 = any(ln.startswith("032") for ln in lines)
-        tem_040 = any(ln.startswith("040") for ln in lines)
-        tem_052 = any(ln.startswith("052") for ln in lines)
-
-        if not (tem_032 or tem_040):
-            raise ValueError("Layout não reconhecido: não há 032 nem 040.")
-
-        modo = "completo" if tem_032 else "simplificado"
-        logger.info(f"🧩 Layout detectado: {modo.upper()}")
-
-        # Trailer do MÃE (052) para validação global (se existir)
-        total_mae_052 = 0
-        if tem_052:
-            trailer_mae_052 = next(ln for ln in reversed(lines) if ln.startswith("052"))
-            total_mae_052 = (
-                _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_rv"])) +
-                _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_ant"])) +
-                _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_aj_cred"])) -
-                _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_aj_deb"]))
-            )
-
-        # -----------------------------------------------------
-        # Agrupamento por PV (robusto por linha)
-        # -----------------------------------------------------
-        pv_map: Dict[str, List[str]] = {}
-
-        for ln in lines:
-            tipo = ln[:3]
-
-            # Header 030 e trailer 052 do MÃE não entram nos filhos
-            if tipo in ("030", "052"):
-                continue
+        # Leitura em bytes via mmap: presença de tipos e trailer por busca direta;
+        # só as linhas roteadas para os filhos são decodificadas
+        with src.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_030 = _decode(next(linhas_mmap(mm)))
+            nsa = _slice(header_030, LAYOUT_POS["030"]["sequencia"])
+            data_emissao = _slice(header_030, LAYOUT_POS["030"]["data_emissao"])
+
+            tem_032 = _tem_tipo(mm, b"032")
+            tem_040 = _tem_tipo(mm, b"040")
+            trailer_mae_052 = _ultima_linha_tipo(mm, b"052")
+            tem_052 = trailer_mae_052 is not None
+
+            if not (tem_032 or tem_040):
+                raise ValueError("Layout não reconhecido: não há 032 nem 040.")
+
+            modo = "completo" if tem_032 else "simplificado"
+            logger.info(f"🧩 Layout detectado: {modo.upper()}")
+
+            # Trailer do MÃE (052) para validação global (se existir)
+            total_mae_052 = 0
+            if tem_052:
+                trailer_mae_052 = _decode(trailer_mae_052)
+                total_mae_052 = (
+                    _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_rv"])) +
+                    _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_ant"])) +
+                    _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_aj_cred"])) -
+                    _to_int_cents(_slice(trailer_mae_052, LAYOUT_POS["052"]["valor_aj_deb"]))
+                )
+
+            # -----------------------------------------------------
+            # Agrupamento por PV (robusto por linha)
+            # -----------------------------------------------------
+            pv_map: Dict[str, List[str]] = {}
+
+            for raw in linhas_mmap(mm):
+                # Header, trailer e demais tipos não entram nos filhos → nem decodifica
+                # (prefixo não-ASCII segue o caminho antigo: o decode pode descartar bytes)
+                tipo_b = raw[:3]
+                if tipo_b not in _TIPOS_ROTEADOS_B and tipo_b.isascii():
+                    continue
+                ln = _decode(raw)
+                tipo = ln[:3]
 
-            if modo == "completo" and tipo == "032":
-                pv = _extract_pv(ln, "032")
-                if pv:
+                # Caso mais frequente primeiro: tipos de detalhe (040, 045, 034, 035, 036, 038, 043).
+                # Header 030 e trailer 052 do MÃE não entram nos filhos (não casam com nenhum ramo).
+                if tipo in TIPOS_DETALHE:
+                    pv = _extract_pv(ln, tipo)
+                    if not pv:
+                        logger.warning(f"⚠️ Não consegui identificar PV no registro {tipo}: {ln[:60]}...")
+                        continue
                     pv_map.setdefault(pv, []).append(ln)
-                continue
 
-            # todos os tipos de detalhe (040, 045, 034, 035, 036, 038, 043)
-            if tipo in ("040", "045", "034", "035", "036", "038", "043"):
-                pv = _extract_pv(ln, tipo)
-                if not pv:
-                    logger.warning(f"⚠️ Não consegui identificar PV no registro {tipo}: {ln[:60]}...")
-                    continue
-                pv_map.setdefault(pv, []).append(ln)
+                elif modo == "completo" and tipo == "032":
+                    pv = _extract_pv(ln, "032")
+                    if pv:
+                        pv_map.setdefault(pv, []).append(ln)
 
         # -----------------------------------------------------
         # Geração dos filhos (030 + registros PV + 052)
@@ -188,6 +223,7 @@ def process_eefi(file_path: str, output_root: str = "output") -> dict:
         arquivos_gerados: List[Path] = []
         soma_filhos = 0
         pv_logs = []
+        filhos_logs = []
 
         for pv, registros in pv_map.items():
             # Totais por PV (somente financeiros)
@@ -196,7 +232,7 @@ def process_eefi(file_path: str, output_root: str = "output") -> dict:
 
             for ln in registros:
                 tipo = ln[:3]
-                if tipo in ("034", "036", "043", "035", "038", "045"):
+                if tipo in TIPOS_FINANCEIROS:
                     # extrai valor conforme tipo; se não houver "valor" no layout, ignora
                     if "valor" in LAYOUT_POS.get(tipo, {}):
                         valor = _to_int_cents(_slice(ln, LAYOUT_POS[tipo]["valor"]))
@@ -250,14 +286,15 @@ def process_eefi(file_path: str, output_root: str = "output") -> dict:
             # Arquivo filho
             child_name = f"{pv}_{data_emissao}_{nsa}_EEFI.txt"
             child_path = out_dir / child_name
-            with child_path.open("w", encoding="utf-8") as f:
-                f.write(hdr_child + "\n")
-                for ln in registros:
-                    f.write(ln + "\n")
-                f.write(trailer_child + "\n")
+            # Conteúdo montado e gravado em um único write
+            with child_path.open("wb", buffering=1 << 20) as f:
+                f.write(("\n".join([hdr_child, *registros, trailer_child]) + "\n").encode("utf-8"))
 
             arquivos_gerados.append(child_path)
-            logger.info(f"🧾 Filho gerado: {child_name} | PV={pv} | Total={total_pv}")
+            filhos_logs.append(f"🧾 Filho gerado: {child_name} | PV={pv} | Total={total_pv}")
+
+        if filhos_logs:
+            logger.info("\n".join(filhos_logs))
 
         # Validação global (se houver trailer 052 no MÃE)
         ok = True
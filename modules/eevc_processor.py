@@ -5,12 +5,17 @@
 #  Descrição: Divide arquivo EEVC por PV, recalcula totais e gera arquivos filhos
 # =============================================================================
 
+import mmap
 import os
 import re
 from collections import defaultdict
 from utils.file_utils import ensure_outfile
 from utils.validation_utils import to_centavos, validar_totais
 
+# Regex do header 002 / nome do arquivo, compiladas uma vez
+_NSA_PV_RE = re.compile(r"(\d{6})(\d{9})")
+_NSA_NOME_RE = re.compile(r"\.(\d{3})\D*$")
+
 
 # =============================================================================
 #  🔹 Funções auxiliares
@@ -28,14 +33,14 @@ def _extract_data_nsa(header_line: str, filename: str) -> tuple[str, str]:
         if raw.isdigit() and len(raw) == 8:
             data_ref = f"{raw[:2]}{raw[2:4]}{raw[6:8]}"
 
-    m = re.search(r"(\d{6})(\d{9})", header_line)
+    m = _NSA_PV_RE.search(header_line)
     if m:
         nsa_candidate = m.group(1)
         if nsa_candidate.isdigit():
             nsa = nsa_candidate[-3:]
 
     if nsa == "000":
-        m2 = re.search(r"\.(\d{3})\D*$", filename)
+        m2 = _NSA_NOME_RE.search(filename)
         if m2 and m2.group(1).isdigit():
             nsa = m2.group(1)
 
@@ -51,16 +56,16 @@ def _rewrite_header_with_pv(header_line: str, pv: str) -> str:
     def repl(m):
         return f"{m.group(1)}{pv9}"
 
-    new_header, count = re.subn(r"(\d{6})\d{9}", repl, header_line, count=1)
+    new_header, count = _NSA_PV_RE.subn(repl, header_line, count=1)
     return new_header if count == 1 else header_line
 
 
-def _liquido_rv(line: str) -> int:
+def _liquido_rv(line: bytes) -> int:
     """
     Extrai o 'Valor líquido' de registros RV (006/010/016/022).
     Posições: 114–128 (15 caracteres, 2 casas decimais implícitas).
     """
-    return to_centavos(line[114:129]) if len(line) >= 129 else 0
+    return to_centavos(line[114:129].decode("latin-1")) if len(line) >= 129 else 0
 
 
 def _build_trailer_026(pv: str, total_liquido_cent: int) -> str:
@@ -90,10 +95,7 @@ def process_eevc(input_path: str, output_dir: str, error_dir: str = "erro") -> d
     print("🟢 Processando EEVC (Vendas Crédito) v4.5")
     filename = os.path.basename(input_path)
 
-    with open(input_path, "r", encoding="latin-1", errors="replace") as f:
-        lines = [l.rstrip("\n") for l in f if l.strip()]
-
-    if not lines:
+    if os.path.getsize(input_path) == 0:
         raise ValueError("Arquivo EEVC vazio.")
 
     header_line = None
@@ -103,55 +105,66 @@ def process_eevc(input_path: str, output_dir: str, error_dir: str = "erro") -> d
     audit = {"012_fonte": 0, "012_gerados": 0}
 
     # Tipos válidos conforme manual EEVC v4.5 (Seção 3 & 4)
-    TIPOS_RV = {"006", "010", "016", "022"}
+    TIPOS_RV = {b"006", b"010", b"016", b"022"}
     TIPOS_VALIDOS = {
-        "002", "004", "005", "033", "006", "008", "034", "040",
-        "010", "011", "012", "035", "014", "016", "017", "018", "036",
-        "019", "020", "021", "022", "024", "029", "026", "028"
+        b"002", b"004", b"005", b"033", b"006", b"008", b"034", b"040",
+        b"010", b"011", b"012", b"035", b"014", b"016", b"017", b"018", b"036",
+        b"019", b"020", b"021", b"022", b"024", b"029", b"026", b"028"
     }
 
     # =====================================================================
     #  🔁 Loop principal de processamento (Stateless)
+    #  Arquivo mapeado em memória e varrido em bytes: tipo/PV são ASCII,
+    #  então nenhuma linha de detalhe precisa ser decodificada.
     # =====================================================================
-    for line in lines:
-        if len(line) < 3:
-            continue
-        tipo = line[:3]
-
-        if tipo == "002":
-            header_line = line
-            continue
-        if tipo == "028":
-            trailer_line = line
-            continue
-
-        if tipo not in TIPOS_VALIDOS:
-            continue  # Ignora linhas fora do layout oficial
-
-        # ✅ EXTRAÇÃO DIRETA DO PV (Manual garante pos. 004-012 para TODOS os registros)
-        if len(line) < 12:
-            continue
-        pv = line[3:12].strip()
-        if not pv.isdigit() or len(pv) != 9:
-            continue
-
-        grupos[pv].append(line)
-        audit["012_fonte"] += (1 if tipo == "012" else 0)
-
-        # Soma valores líquidos apenas dos RVs para validação com trailer 028
-        if tipo in TIPOS_RV:
-            totais_pv[pv] += _liquido_rv(line)
+    with open(input_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b""):
+            line = line.rstrip(b"\r\n")
+            if len(line) < 3:
+                continue
+            tipo = line[:3]
+
+            if tipo == b"002":
+                header_line = line
+                continue
+            if tipo == b"028":
+                trailer_line = line
+                continue
+
+            if tipo not in TIPOS_VALIDOS:
+                continue  # Ignora linhas fora do layout oficial
+
+            # ✅ EXTRAÇÃO DIRETA DO PV (Manual garante pos. 004-012 para TODOS os registros)
+            if len(line) < 12:
+                continue
+            pv = line[3:12]
+            if not pv.isdigit():
+                continue
+            pv = pv.decode("ascii")
+
+            grupos[pv].append(line)
+            audit["012_fonte"] += (1 if tipo == b"012" else 0)
+
+            # Soma valores líquidos apenas dos RVs para validação com trailer 028
+            if tipo in TIPOS_RV:
+                totais_pv[pv] += _liquido_rv(line)
 
     # Validação de estrutura mínima
     if not header_line or not trailer_line:
         raise ValueError("Header (002) ou Trailer (028) ausentes no arquivo EEVC.")
 
+    # Só header e trailer voltam a texto (regex/slicing de campos)
+    header_line = header_line.decode("latin-1")
+    trailer_line = trailer_line.decode("latin-1")
+    trailer_bytes = (trailer_line + "\n").encode("latin-1")
+
     data_ref, nsa = _extract_data_nsa(header_line, filename)
 
     # =====================================================================
     #  📤 Geração dos arquivos filhos
     # =====================================================================
     gerados = []
+    log_linhas = []
     soma_total_processado = 0
 
     subdir = os.path.join(output_dir, f"NSA_{nsa}")
@@ -168,18 +181,23 @@ def process_eevc(input_path: str, output_dir: str, error_dir: str = "erro") -> d
         nome_arquivo = f"{pv}_{data_ref}_{nsa}_EEVC.txt"
         out_path = os.path.join(subdir, nome_arquivo)
 
-        with open(out_path, "w", encoding="latin-1", errors="ignore") as f:
-            f.write(header_pv + "\n")
-            for l in blocos:
-                # Substitui o 026 original pelo recalculado
-                if not l.startswith("026"):
-                    f.write(l + "\n")
-            f.write(trailer_026 + "\n")
-            f.write(trailer_line + "\n")
+        # Substitui o 026 original pelo recalculado; arquivo montado e gravado de uma vez
+        linhas_out = [
+            header_pv.encode("latin-1", errors="ignore"),
+            *(l for l in blocos if not l.startswith(b"026")),
+            trailer_026.encode("latin-1"),
+        ]
+        with open(out_path, "wb", buffering=1 << 20) as f:
+            f.write(b"\n".join(linhas_out) + b"\n" + trailer_bytes)
 
         gerados.append(out_path)
-        audit["012_gerados"] += sum(1 for l in blocos if l.startswith("012"))
-        print(f"🧾 Gerado: {os.path.basename(out_path)} | Líquido: {total_liquido_rv} | 012: {sum(1 for l in blocos if l.startswith('012'))}")
+        qtd_012 = sum(1 for l in blocos if l.startswith(b"012"))
+        audit["012_gerados"] += qtd_012
+        log_linhas.append(f"🧾 Gerado: {os.path.basename(out_path)} | Líquido: {total_liquido_rv} | 012: {qtd_012}")
+
+    # Resumo dos filhos em um único print (evita um flush de stdout por arquivo)
+    if log_linhas:
+        print("\n".join(log_linhas))
 
     # =====================================================================
     #  ✅ Validação final + Auditoria de integridade
@@ -27,21 +27,38 @@
 
 import os
 import re
-from collections import defaultdict, Counter
-from utils.file_utils import ensure_outfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from utils.file_utils import ensure_outfile, sanitize_filename
 from utils.validation_utils import validar_totais, to_centavos
 
 
+# Regex do nome do arquivo (fallback de data/NSA), compiladas uma vez
+_DATA_NOME_RE = re.compile(r"(\d{6,8})")
+_NSA_NOME_RE = re.compile(r"(\d{3})\D*\.[0-9]+$")
+
+# Tipos que caracterizam movimento real (arquivo/PV com conteúdo próprio)
+TIPOS_MOVIMENTO = {"01", "011", "05", "13", "20", "08", "09", "11", "17", "18", "19"}
+
+# Ajustes/informativos: tipo → índice do campo que traz o PV
+PV_IDX_AJUSTES = {"08": 1, "09": 1, "11": 2, "17": 5, "18": 2, "19": 2}
+
+
 # -------------------------------------------------------------
 # Funções auxiliares
 # -------------------------------------------------------------
 def _pad(n: int, width: int) -> str:
-    return str(n).zfill(width)
+    return f"{n:0{width}d}"
+
+
+def _pad6(n: int) -> str:
+    """Atalho de _pad para o caso mais frequente (contadores 9(6))."""
+    return f"{n:06d}"
 
 
 def _val(n: int) -> str:
     """Formata valor numérico para 9(15)V99 sem sinal (layout REDE)."""
-    return str(abs(int(n))).zfill(15)
+    return f"{abs(int(n)):015d}"
 
 
 def _extrair_data_nsa(header_parts: list[str], nome_arquivo: str):
@@ -50,24 +67,78 @@ def _extrair_data_nsa(header_parts: list[str], nome_arquivo: str):
     nsa = "000"
     if len(header_parts) > 3:
         campo_data_mov = header_parts[2].strip()
-        if re.fullmatch(r"\d{8}", campo_data_mov):
+        if len(campo_data_mov) == 8 and campo_data_mov.isdigit():
             data_ref = f"{campo_data_mov[:2]}{campo_data_mov[2:4]}{campo_data_mov[6:8]}"
     if len(header_parts) > 7:
         campo_nsa = header_parts[7].strip()
         if campo_nsa.isdigit():
             nsa = campo_nsa[-3:].zfill(3)
     if data_ref == "000000":
-        m = re.search(r"(\d{6,8})", nome_arquivo)
+        m = _DATA_NOME_RE.search(nome_arquivo)
         if m:
             data_ref = m.group(1)[-6:]
     if nsa == "000":
-        m = re.search(r"(\d{3})\D*\.[0-9]+$", nome_arquivo)
+        m = _NSA_NOME_RE.search(nome_arquivo)
         if m:
             nsa = m.group(1)
     print(f"🧠 Data extraída: {data_ref} | NSA extraído: {nsa} | Origem: {os.path.basename(nome_arquivo)}")
     return data_ref, nsa
 
 
+class _PvIds(dict):
+    """Mapeia PV → id inteiro sequencial (atribuído na primeira ocorrência)."""
+    def __missing__(self, pv: str) -> int:
+        pid = self[pv] = len(self)
+        return pid
+
+
+class _LeitorEEVD:
+    """
+    Lê o EEVD linha a linha (sem materializar o arquivo).
+    Iterar devolve o header e, em seguida, os detalhes; o último trailer 04
+    (ou a última linha, se não houver 04) fica em .trailer ao fim da leitura.
+    As linhas a partir de um 04 ficam pendentes até se saber se ele é o último.
+    """
+
+    def __init__(self, input_path: str):
+        self.input_path = input_path
+        self._trailer = None
+        self._concluido = False
+
+    @property
+    def trailer(self):
+        """Último trailer do arquivo-mãe (None se não houver); exige a leitura completa."""
+        if not self._concluido:
+            raise RuntimeError("Trailer do EEVD só é conhecido após ler o arquivo inteiro.")
+        return self._trailer
+
+    def __iter__(self):
+        anterior = None
+        pendentes = None
+        with open(self.input_path, "r", encoding="utf-8", errors="replace", buffering=1 << 20) as f:
+            linhas = (l.strip() for l in f)
+            linhas = (l for l in linhas if l)
+            header = next(linhas, None)
+            if header is not None:
+                yield header
+                for ln in linhas:
+                    if ln.startswith("04,") or ln == "04":
+                        if anterior is not None:
+                            yield anterior
+                            anterior = None
+                        if pendentes:
+                            yield from pendentes
+                        pendentes = [ln]
+                    elif pendentes is not None:
+                        pendentes.append(ln)
+                    else:
+                        if anterior is not None:
+                            yield anterior
+                        anterior = ln
+        self._trailer = pendentes[0] if pendentes else anterior
+        self._concluido = True
+
+
 def _format_detalhe_validacao(detalhe_dict, total_bruto, total_desc, total_liq):
     """Gera texto amigável para o campo 'Detalhe' do histórico."""
     def _msg(chave, valor, total):
@@ -87,6 +158,58 @@ def _format_detalhe_validacao(detalhe_dict, total_bruto, total_desc, total_liq):
         return f"{bruto_msg} | {desc_msg} | {liq_msg}"
 
 
+def _nome_filho(pv: str, data_ref: str, nsa: str) -> str:
+    return f"{pv}_{data_ref}_{nsa}_EEVD.txt"
+
+
+def _gerar_filho(pv: str, regs: list[str], s: dict, header_prefix: str, header_suffix: str,
+                 matriz_ou_grupo: str, data_ref: str, nsa: str, lote_dir: str):
+    """
+    Monta e grava o arquivo filho de um PV.
+    Retorna (caminho ou None se ignorado, mensagem de log) — o print fica com o chamador.
+    """
+    if pv == matriz_ou_grupo:
+        has_mov_matriz = any(r.split(",", 1)[0].strip() in TIPOS_MOVIMENTO for r in regs)
+        if not has_mov_matriz:
+            return None, f"⚪ Ignorado PV matriz/grupo {pv} (sem movimento próprio)"
+
+    bruto = int(s["bruto"])
+    desc = int(s["desconto"])
+    liq = int(s["liquido"])
+    bruto_pred = int(s["bruto_pred"])
+    desc_pred = int(s["desc_pred"])
+    liq_pred = int(s["liq_pred"])
+    qtd_rv = int(s["qtd_rv"])
+    qtd_cv = int(s["qtd_cv"])
+
+    linhas_out = [f"{header_prefix},{pv}{header_suffix}"] + regs
+
+    trailer_id = matriz_ou_grupo
+
+    # Os seis valores são idênticos em 02/03/04 → formatados uma única vez
+    valores = (
+        f"{_val(bruto)},{_val(desc)},{_val(liq)},"
+        f"{_val(bruto_pred)},{_val(desc_pred)},{_val(liq_pred)}"
+    )
+    corpo02 = f"{trailer_id},{_pad(qtd_rv, 3)},{_pad6(qtd_cv)},{valores}"
+
+    total_registros = len(linhas_out) + 3
+    linhas_out += [
+        "02," + corpo02,
+        "03," + corpo02,
+        f"04,{trailer_id},{_pad6(qtd_rv)},{_pad6(qtd_cv)},{valores},{_pad6(total_registros)}",
+    ]
+
+    out_path = ensure_outfile(lote_dir, _nome_filho(pv, data_ref, nsa))
+    # Payload montado e codificado uma única vez → um write por filho
+    with open(out_path, "wb", buffering=1 << 20) as f:
+        f.write(("\n".join(linhas_out) + "\n").encode("utf-8"))
+    return out_path, (
+        f"🧾 Gerado: {os.path.basename(out_path)} → {lote_dir}\n"
+        f"   ↳ Totais PV {pv}: Bruto={bruto} | Desc={desc} | Líq={liq} | RV={qtd_rv} | CV={qtd_cv}"
+    )
+
+
 # -------------------------------------------------------------
 # Função principal
 # -------------------------------------------------------------
@@ -99,122 +222,124 @@ def process_eevd(input_path: str, output_dir: str, error_dir: str = "erro"):
     print("🟢 Processando EEVD (Vendas Débito)")
     filename = os.path.basename(input_path)
 
-    with open(input_path, "r", encoding="utf-8", errors="replace") as f:
-        lines = [l.strip() for l in f if l.strip()]
-
-    if len(lines) < 2:
+    # Leitura em streaming: header primeiro, depois apenas os detalhes
+    leitor = _LeitorEEVD(input_path)
+    detalhes = iter(leitor)
+    header_line = next(detalhes, None)
+    if header_line is None:
         raise ValueError("Arquivo EEVD vazio ou sem trailer.")
 
-    header_line = lines[0]
     header_parts = [p.strip() for p in header_line.split(",")]
 
-    # Último trailer 04 (arquivo-mãe)
-    last_04_idx = max(i for i, l in enumerate(lines) if l.split(",")[0] == "04") if any("04" in l[:3] for l in lines) else len(lines) - 1
-    trailer_line = lines[last_04_idx]
-    trailer_parts = [p.strip() for p in trailer_line.split(",")]
-    detalhes = lines[1:last_04_idx]
-
     data_ref, nsa = _extrair_data_nsa(header_parts, filename)
     lote_dir = os.path.join(output_dir, f"NSA_{nsa}")
-    os.makedirs(lote_dir, exist_ok=True)
-    print(f"📂 Criado diretório de saída: {lote_dir}")
 
+    # PVs se repetem muito: as estruturas por PV usam o id inteiro como chave
+    pv_ids = _PvIds()
+    # Guarda a linha original (já com strip) — evita re-serializar os campos na escrita
     registros_por_pv = defaultdict(list)
     stats_pv = defaultdict(lambda: {
         "qtd_rv": 0, "qtd_cv": 0,
         "bruto": 0, "desconto": 0, "liquido": 0,
         "bruto_pred": 0, "desc_pred": 0, "liq_pred": 0
     })
-    contagem_tipos = Counter()
+    contagem_tipos = defaultdict(int)
     rv_to_pv = {}
+    soma_bruto_total = soma_desc_total = soma_liq_total = 0
 
     # -------------------------------------------------------------
     # Parsing de registros
     # -------------------------------------------------------------
     for raw in detalhes:
-        parts = [p.strip() for p in raw.split(",")]
-        if not parts:
-            continue
-        t = parts[0]
+        # Campo 9 é o último lido → maxsplit limita a lista; strip só nos campos usados
+        parts = raw.split(",", 10)
+        t = parts[0].strip()
         contagem_tipos[t] += 1
         pv = None
 
         # RV Originais
         if t == "01":
-            pv = parts[1] if len(parts) > 1 else None
-            if len(parts) > 4:
-                rv_to_pv[parts[4]] = pv
-            qtd_cv = int(parts[5]) if len(parts) > 5 and parts[5].isdigit() else 0
-            bruto = to_centavos(parts[6]) if len(parts) > 6 else 0
-            desconto = to_centavos(parts[7]) if len(parts) > 7 else 0
-            liquido = to_centavos(parts[8]) if len(parts) > 8 else 0
-            tipo = (parts[9] if len(parts) > 9 else "").upper()
+            n = len(parts)
+            pv = parts[1].strip() if n > 1 else None
+            if n > 4:
+                rv_to_pv[parts[4].strip()] = pv
+            cv_txt = parts[5].strip() if n > 5 else ""
+            qtd_cv = int(cv_txt) if cv_txt.isdigit() else 0
+            bruto = to_centavos(parts[6].strip()) if n > 6 else 0
+            desconto = to_centavos(parts[7].strip()) if n > 7 else 0
+            liquido = to_centavos(parts[8].strip()) if n > 8 else 0
+            tipo = (parts[9].strip() if n > 9 else "").upper()
 
             if pv:
-                s = stats_pv[pv]
+                pid = pv_ids[pv]
+                s = stats_pv[pid]
                 s["qtd_rv"] += 1
                 s["qtd_cv"] += qtd_cv
                 s["bruto"] += bruto
                 s["desconto"] += desconto
                 s["liquido"] += liquido
+                soma_bruto_total += bruto
+                soma_desc_total += desconto
+                soma_liq_total += liquido
                 if tipo == "P":
                     s["bruto_pred"] += bruto
                     s["desc_pred"] += desconto
                     s["liq_pred"] += liquido
-                registros_por_pv[pv].append(parts)
+                registros_por_pv[pid].append(raw)
             continue
 
         # Cancelamentos (não somam nos totais)
         if t == "011":
-            pv = parts[1] if len(parts) > 1 else None
+            pv = parts[1].strip() if len(parts) > 1 else None
             if pv:
-                registros_por_pv[pv].append(parts)
-                stats_pv[pv]["qtd_cv"] += 1
+                pid = pv_ids[pv]
+                registros_por_pv[pid].append(raw)
+                stats_pv[pid]["qtd_cv"] += 1
             continue
 
         # CVs detalhados
         if t in {"05", "13"}:
-            pv = parts[1] if len(parts) > 1 else None
+            pv = parts[1].strip() if len(parts) > 1 else None
             if pv:
-                registros_por_pv[pv].append(parts)
-                stats_pv[pv]["qtd_cv"] += 1
+                pid = pv_ids[pv]
+                registros_por_pv[pid].append(raw)
+                stats_pv[pid]["qtd_cv"] += 1
             continue
 
         # CVs recarga (via RV→PV)
         if t == "20":
-            rv = parts[3] if len(parts) > 3 else (parts[2] if len(parts) > 2 else None)
+            rv = parts[3].strip() if len(parts) > 3 else (parts[2].strip() if len(parts) > 2 else None)
             if rv and rv in rv_to_pv:
-                pv = rv_to_pv[rv]
-                registros_por_pv[pv].append(parts)
-                stats_pv[pv]["qtd_cv"] += 1
+                pid = pv_ids[rv_to_pv[rv]]
+                registros_por_pv[pid].append(raw)
+                stats_pv[pid]["qtd_cv"] += 1
             elif len(registros_por_pv) == 1:
-                pv_unico = next(iter(registros_por_pv.keys()))
-                registros_por_pv[pv_unico].append(parts)
-                stats_pv[pv_unico]["qtd_cv"] += 1
+                pid_unico = next(iter(registros_por_pv.keys()))
+                registros_por_pv[pid_unico].append(raw)
+                stats_pv[pid_unico]["qtd_cv"] += 1
             continue
 
         # Ajustes e informativos
-        if t == "08":
-            pv = parts[1] if len(parts) > 1 else None
-        elif t == "09":
-            pv = parts[1] if len(parts) > 1 else None
-        elif t == "11":
-            pv = parts[2] if len(parts) > 2 else None
-        elif t == "17":
-            pv = parts[5] if len(parts) > 5 else None
-        elif t == "18":
-            pv = parts[2] if len(parts) > 2 else None
-        elif t == "19":
-            pv = parts[2] if len(parts) > 2 else None
+        idx = PV_IDX_AJUSTES.get(t)
+        if idx is not None:
+            pv = parts[idx].strip() if len(parts) > idx else None
 
         if pv:
-            registros_por_pv[pv].append(parts)
+            registros_por_pv[pv_ids[pv]].append(raw)
+
+    # Último trailer 04 (arquivo-mãe), identificado durante a leitura
+    trailer_line = leitor.trailer
+    if trailer_line is None:
+        raise ValueError("Arquivo EEVD vazio ou sem trailer.")
+    trailer_parts = [p.strip() for p in trailer_line.split(",")]
+
+    os.makedirs(lote_dir, exist_ok=True)
+    print(f"📂 Criado diretório de saída: {lote_dir}")
 
     # -------------------------------------------------------------
     # Verificação de movimento
     # -------------------------------------------------------------
-    TIPOS_MOVIMENTO = {"01", "011", "05", "13", "20", "08", "09", "11", "17", "18", "19"}
-    tem_movimento = any(contagem_tipos[t] > 0 for t in TIPOS_MOVIMENTO)
+    tem_movimento = any(contagem_tipos.get(t, 0) > 0 for t in TIPOS_MOVIMENTO)
 
     if not tem_movimento:
         print("ℹ️ Arquivo sem movimento real (00 + 04). Gerando arquivo vazio.")
@@ -226,10 +351,10 @@ def process_eevd(input_path: str, output_dir: str, error_dir: str = "erro"):
             trailer_sem = [
                 "04",
                 header_parts[1] if len(header_parts) > 1 else "0",
-                _pad(0, 6), _pad(0, 6),
+                _pad6(0), _pad6(0),
                 zeros15, zeros15, zeros15,
                 zeros15, zeros15, zeros15,
-                _pad(2, 6)
+                _pad6(2)
             ]
             f.write(",".join(trailer_sem) + "\n")
         return {
@@ -250,10 +375,6 @@ def process_eevd(input_path: str, output_dir: str, error_dir: str = "erro"):
     total_desc_trailer = to_centavos(trailer_parts[5] if len(trailer_parts) > 5 else "0")
     total_liq_trailer = to_centavos(trailer_parts[6] if len(trailer_parts) > 6 else "0")
 
-    soma_bruto_total = sum(s["bruto"] for s in stats_pv.values())
-    soma_desc_total = sum(s["desconto"] for s in stats_pv.values())
-    soma_liq_total = sum(s["liquido"] for s in stats_pv.values())
-
     det_bruto = validar_totais(total_bruto_trailer, soma_bruto_total)
     det_desc = validar_totais(total_desc_trailer, soma_desc_total)
     det_liq = validar_totais(total_liq_trailer, soma_liq_total)
@@ -267,62 +388,29 @@ def process_eevd(input_path: str, output_dir: str, error_dir: str = "erro"):
     # -------------------------------------------------------------
     # Geração dos filhos por PV
     # -------------------------------------------------------------
-    gerados = []
     matriz_ou_grupo = header_parts[1] if len(header_parts) > 1 else "0"
-
-    for pv, regs in registros_por_pv.items():
-        if not regs:
-            continue
-        if pv == matriz_ou_grupo:
-            has_mov_matriz = any(r[0] in TIPOS_MOVIMENTO for r in regs)
-            if not has_mov_matriz:
-                print(f"⚪ Ignorado PV matriz/grupo {pv} (sem movimento próprio)")
-                continue
-
-        s = stats_pv[pv]
-        bruto = int(s["bruto"])
-        desc = int(s["desconto"])
-        liq = int(s["liquido"])
-        bruto_pred = int(s["bruto_pred"])
-        desc_pred = int(s["desc_pred"])
-        liq_pred = int(s["liq_pred"])
-        qtd_rv = int(s["qtd_rv"])
-        qtd_cv = int(s["qtd_cv"])
-
-        header_pv = header_parts.copy()
-        header_pv[1] = pv
-        linhas_out = [",".join(header_pv)] + [",".join(p) for p in regs]
-
-        trailer_id = matriz_ou_grupo
-
-        reg02 = [
-            "02", trailer_id,
-            _pad(qtd_rv, 3), _pad(qtd_cv, 6),
-            _val(bruto), _val(desc), _val(liq),
-            _val(bruto_pred), _val(desc_pred), _val(liq_pred)
-        ]
-
-        reg03 = reg02.copy()
-        reg03[0] = "03"
-
-        total_registros = len(linhas_out) + 3
-        reg04 = [
-            "04", trailer_id,
-            _pad(qtd_rv, 6), _pad(qtd_cv, 6),
-            _val(bruto), _val(desc), _val(liq),
-            _val(bruto_pred), _val(desc_pred), _val(liq_pred),
-            _pad(total_registros, 6)
-        ]
-
-        linhas_out += [",".join(reg02), ",".join(reg03), ",".join(reg04)]
-
-        nome_arquivo = f"{pv}_{data_ref}_{nsa}_EEVD.txt"
-        out_path = ensure_outfile(lote_dir, nome_arquivo)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(linhas_out) + "\n")
-        gerados.append(out_path)
-        print(f"🧾 Gerado: {os.path.basename(out_path)} → {lote_dir}")
-        print(f"   ↳ Totais PV {pv}: Bruto={bruto} | Desc={desc} | Líq={liq} | RV={qtd_rv} | CV={qtd_cv}")
+    pv_order = list(pv_ids)
+    # Só o campo 2 do header muda por PV: prefixo/sufixo montados uma vez
+    header_prefix = header_parts[0]
+    header_suffix = "".join("," + p for p in header_parts[2:])
+    tarefas = [(pv_order[pid], regs, stats_pv[pid]) for pid, regs in registros_por_pv.items() if regs]
+
+    def gerar(t):
+        return _gerar_filho(*t, header_prefix, header_suffix, matriz_ou_grupo, data_ref, nsa, lote_dir)
+
+    # PVs distintos podem virar o mesmo nome após a sanitização ("12 3" / "12/3")
+    destinos = [sanitize_filename(_nome_filho(t[0], data_ref, nsa)) for t in tarefas]
+    if len(set(destinos)) == len(destinos):
+        # Cada filho é independente (só I/O) → escrita concorrente, preservando a ordem
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            resultados = list(ex.map(gerar, tarefas))
+    else:
+        # Colisão de nomes → sequencial, na ordem dos PVs (o último grava por cima, como antes)
+        resultados = [gerar(t) for t in tarefas]
+    gerados = [out_path for out_path, _ in resultados if out_path]
+    # Um único print com o resumo de todos os filhos
+    if resultados:
+        print("\n".join(msg for _, msg in resultados))
 
     detalhe_dict = {"bruto": det_bruto, "desconto": det_desc, "liquido": det_liq}
     detalhe_texto = _format_detalhe_validacao(detalhe_dict, total_bruto_trailer, total_desc_trailer, total_liq_trailer)
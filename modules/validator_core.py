@@ -7,8 +7,12 @@
 from pathlib import Path
 import csv
 import logging
+import multiprocessing
+import os
 import re
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 # -------------------------------------------------------------
 # CONFIGURAÇÃO DE LOG
@@ -16,6 +20,15 @@ from collections import defaultdict
 logger = logging.getLogger("splitter_validator")
 logger.setLevel(logging.INFO)
 
+# Regex compilada uma vez (chamada por linha no fallback de extract_pv)
+_PV_RE = re.compile(r"\d{9}")
+
+# Até este tamanho o arquivo é lido inteiro com read_bytes (caso típico dos filhos)
+LEITURA_DIRETA_MAX = 8 << 20
+
+# Abaixo deste volume (soma dos filhos) subir o pool custa mais que indexar em sequência
+POOL_MIN_BYTES = 32 << 20
+
 # -------------------------------------------------------------
 # FUNÇÕES AUXILIARES
 # -------------------------------------------------------------
@@ -28,48 +41,84 @@ def extract_pv(line: str) -> str | None:
     pv = line[3:12].strip()
     if pv.isdigit() and len(pv) == 9:
         return pv
-    m = re.search(r"\d{9}", line[:80])
+    m = _PV_RE.search(line, 0, 80)
     return m.group(0) if m else None
 
 # -------------------------------------------------------------
-def indexar_arquivo(arquivo: Path | str, tipos_validos: tuple[str, ...]) -> dict[str, list[str]]:
-    """
-    Lê um arquivo e indexa os tipos de registro por PV.
-    Retorna um dicionário { pv: [tipos...] }.
-    """
-    registros = defaultdict(list)
-    with open(arquivo, encoding="utf-8", errors="ignore") as f:
-        for ln in f:
-            tipo = extract_tipo(ln)
-            if tipo not in tipos_validos:
-                continue
-            pv = extract_pv(ln)
-            if not pv:
+def _contar_por_pv(linhas, tipos_validos: frozenset[str]) -> dict[str, Counter]:
+    """Conta os tipos de registro por PV a partir de um iterável de linhas."""
+    registros = defaultdict(Counter)
+    # Laço quente: extract_tipo/extract_pv inlinados e lookups em nomes locais
+    pv_search = _PV_RE.search
+    for ln in linhas:
+        tipo = ln[:3]
+        if tipo not in tipos_validos:
+            continue
+        pv = ln[3:12]
+        if not (pv.isdigit() and len(pv) == 9):
+            m = pv_search(ln, 0, 80)
+            if m is None:
                 continue
-            registros[pv].append(tipo)
+            pv = m.group(0)
+        registros[pv][tipo] += 1
     return dict(registros)
 
 # -------------------------------------------------------------
-def comparar(mae_dict: dict[str, list[str]], filhos_dict: dict[str, list[str]]) -> list[list]:
+def indexar_arquivo(arquivo: Path | str, tipos_validos: tuple[str, ...]) -> dict[str, Counter]:
+    """
+    Lê um arquivo e conta os tipos de registro por PV.
+    Retorna um dicionário { pv: Counter({tipo: qtd}) }.
+    Arquivos pequenos (filhos) são lidos de uma vez, sem a pilha de I/O em texto.
+    """
+    tipos_validos = frozenset(tipos_validos)
+    if os.path.getsize(arquivo) <= LEITURA_DIRETA_MAX:
+        linhas = Path(arquivo).read_bytes().decode("utf-8", errors="ignore").split("\n")
+        return _contar_por_pv(linhas, tipos_validos)
+    with open(arquivo, encoding="utf-8", errors="ignore", buffering=1 << 20) as f:
+        return _contar_por_pv(f, tipos_validos)
+
+# -------------------------------------------------------------
+def _index_child(arquivo: Path | str, tipos_validos: tuple[str, ...]) -> Counter:
+    """Indexa um arquivo filho e devolve um único Counter (todos os PVs somados)."""
+    contagem = Counter()
+    for cont in indexar_arquivo(arquivo, tipos_validos).values():
+        contagem.update(cont)
+    return contagem
+
+# -------------------------------------------------------------
+def _listar_filhos(pasta: Path) -> list[os.DirEntry]:
+    """Lista os arquivos *.txt da pasta com uma única varredura (scandir, sem fnmatch)."""
+    if not pasta.is_dir():
+        return []
+    with os.scandir(pasta) as it:
+        return [e for e in it if e.name.endswith(".txt") and e.is_file()]
+
+# -------------------------------------------------------------
+def comparar(
+    mae_dict: dict[str, Counter],
+    filhos_dict: dict[str, Counter],
+    tipos_validos: tuple[str, ...] | None = None
+) -> list[list]:
     """
     Compara os dicionários de registros mãe e filhos.
     Retorna uma lista de resultados [PV, Tipo, Qtd_Mãe, Qtd_Filho, Status].
+    Se tipos_validos for informado, a ordem dos tipos é calculada uma única vez.
     """
     resultados = []
     todos_pvs = sorted(set(mae_dict.keys()) | set(filhos_dict.keys()))
+    tipos_ordenados = sorted(tipos_validos) if tipos_validos else None
 
     for pv in todos_pvs:
-        tipos_mae = mae_dict.get(pv, [])
-        tipos_filho = filhos_dict.get(pv, [])
-
-        cont_mae = {t: tipos_mae.count(t) for t in set(tipos_mae)}
-        cont_filho = {t: tipos_filho.count(t) for t in set(tipos_filho)}
-        todos_tipos = sorted(set(cont_mae.keys()) | set(cont_filho.keys()))
+        cont_mae = mae_dict.get(pv, {})
+        cont_filho = filhos_dict.get(pv, {})
+        todos_tipos = tipos_ordenados or sorted(cont_mae.keys() | cont_filho.keys())
 
         for tipo in todos_tipos:
             mae_qtd = cont_mae.get(tipo, 0)
             filho_qtd = cont_filho.get(tipo, 0)
             if mae_qtd == filho_qtd:
+                if not mae_qtd:
+                    continue  # tipo ausente nos dois lados
                 status = "OK"
             elif filho_qtd < mae_qtd:
                 status = "Faltando"
@@ -82,7 +131,7 @@ def comparar(mae_dict: dict[str, list[str]], filhos_dict: dict[str, list[str]])
 # -------------------------------------------------------------
 def gerar_csv(resultados: list[list], arquivo_csv: Path | str) -> Path:
     """Gera o relatório CSV consolidado."""
-    with open(arquivo_csv, "w", newline="", encoding="utf-8") as fp:
+    with open(arquivo_csv, "w", newline="", encoding="utf-8", buffering=1 << 20) as fp:
         writer = csv.writer(fp, delimiter=";")
         writer.writerow(["PV", "Tipo", "Qtd_Mãe", "Qtd_Filho", "Status"])
         writer.writerows(resultados)
@@ -113,7 +162,8 @@ def validar_generico(
         logger.error(f"❌ Arquivo mãe não encontrado: {arquivo_mae}")
         return {"ok": False, "mensagem": f"Arquivo mãe não encontrado: {arquivo_mae}"}
 
-    if not pasta_filhos.exists() or not any(pasta_filhos.glob("*.txt")):
+    children = _listar_filhos(pasta_filhos)
+    if not children:
         logger.error(f"❌ Nenhum arquivo filho encontrado em: {pasta_filhos}")
         return {"ok": False, "mensagem": f"Nenhum arquivo filho encontrado em: {pasta_filhos}"}
 
@@ -121,21 +171,33 @@ def validar_generico(
     mae_dict = indexar_arquivo(arquivo_mae, tipos_validos)
     filhos_dict = {}
 
-    for child in pasta_filhos.glob("*.txt"):
-        pv = child.stem.split("_")[0]
-        filhos_dict[pv] = []
-        filhos_dict[pv].extend(sum(indexar_arquivo(child, tipos_validos).values(), []))
+    # Filhos são independentes → indexação em paralelo só quando o volume compensa
+    paths = [child.path for child in children]
+    indexar = partial(_index_child, tipos_validos=tipos_validos)
+    total_bytes = sum(child.stat().st_size for child in children)
+    if len(children) > 1 and total_bytes >= POOL_MIN_BYTES:
+        workers = min(os.cpu_count() or 1, len(children))
+        chunksize = max(1, len(children) // (workers * 4))
+        # spawn: o processo do Flask/gunicorn tem threads (agente) → não fazer fork dele
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            results = list(ex.map(indexar, paths, chunksize=chunksize))
+    else:
+        results = map(indexar, paths)
+    for child, contagem in zip(children, results):
+        pv = child.name[:-4].split("_")[0]
+        filhos_dict[pv] = contagem
 
     # Comparação
-    resultados = comparar(mae_dict, filhos_dict)
+    resultados = comparar(mae_dict, filhos_dict, tipos_validos)
 
     # CSV
     gerar_csv(resultados, relatorio_csv)
 
     # Resumo
-    total_ok = sum(1 for r in resultados if r[-1] == "OK")
-    total_faltando = sum(1 for r in resultados if r[-1] == "Faltando")
-    total_extra = sum(1 for r in resultados if r[-1] == "Extra")
+    status_counts = Counter(r[4] for r in resultados)
+    total_ok = status_counts["OK"]
+    total_faltando = status_counts["Faltando"]
+    total_extra = status_counts["Extra"]
 
     logger.info(f"✅ Validação {tipo} concluída: OK={total_ok}, Faltando={total_faltando}, Extra={total_extra}")
     logger.info(f"Relatório salvo em: {relatorio_csv}")
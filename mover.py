@@ -1,8 +1,30 @@
+import errno
 import shutil
 import os
 
+# Diretórios já garantidos nesta execução (evita mkdir a cada arquivo)
+_MADE_DIRS: set[str] = set()
+
+def _mover(source_path, dest_path):
+    try:
+        # Mesmo filesystem: um único rename atômico
+        os.replace(source_path, dest_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source_path, dest_path)
+
 def move_processed_file(source_path, target_dir):
-    os.makedirs(target_dir, exist_ok=True)
+    if target_dir not in _MADE_DIRS:
+        os.makedirs(target_dir, exist_ok=True)
+        _MADE_DIRS.add(target_dir)
     dest_path = os.path.join(target_dir, os.path.basename(source_path))
-    shutil.move(source_path, dest_path)
+    try:
+        _mover(source_path, dest_path)
+    except FileNotFoundError:
+        if not os.path.exists(source_path):
+            raise
+        # Destino removido depois de entrar no cache → recria e tenta de novo
+        os.makedirs(target_dir, exist_ok=True)
+        _mover(source_path, dest_path)
     print(f'📦 Arquivo movido para {dest_path}')
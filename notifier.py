@@ -1,21 +1,69 @@
+import atexit
 import smtplib
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 
 SMTP_SERVER = 'smtp.seuservidor.com'
 SMTP_PORT = 587
 SMTP_USER = 'no-reply@netunna.com'
 SMTP_PASS = 'SENHA_AQUI'
+SMTP_TIMEOUT = 30  # segundos; socket travado não pode prender a fila nem o desligamento
+
+# Conexão SMTP reaproveitada entre alertas (connect + STARTTLS + login só na 1ª vez)
+_server = None
+_lock = threading.Lock()
+# Fila de envio: 1 worker → ordem preservada e o processamento não espera o SMTP
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alertas')
+
+def _connect():
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    server.starttls()
+    server.login(SMTP_USER, SMTP_PASS)
+    return server
+
+def _send(msg):
+    global _server
+    with _lock:
+        if _server is None:
+            _server = _connect()
+        try:
+            _server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Servidor derrubou a sessão ociosa → reconecta e tenta uma vez
+            _server = _connect()
+            _server.send_message(msg)
+        except (socket.timeout, ConnectionError):
+            # Timeout/erro de socket: sessão em estado incerto → descarta; o próximo alerta reconecta
+            # (recusas SMTP como destinatário inválido mantêm a sessão, que segue saudável)
+            _server = None
+            raise
+
+def _send_logged(msg, destino):
+    try:
+        _send(msg)
+        print(f'📧 Alerta enviado para {destino}')
+    except Exception as e:
+        print(f'❌ Falha ao enviar alerta: {e}')
 
 def send_alert(assunto, corpo, destino):
     msg = MIMEText(corpo)
     msg['Subject'] = assunto
     msg['From'] = SMTP_USER
     msg['To'] = destino
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
-        print(f'📧 Alerta enviado para {destino}')
-    except Exception as e:
-        print(f'❌ Falha ao enviar alerta: {e}')
+    return _executor.submit(_send_logged, msg, destino)
+
+def close_alerts():
+    """Drena a fila de alertas e encerra a conexão SMTP persistente (chamar no desligamento)."""
+    global _server
+    _executor.shutdown(wait=True)
+    with _lock:
+        if _server is not None:
+            try:
+                _server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            _server = None
+
+atexit.register(close_alerts)
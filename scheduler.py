@@ -1,12 +1,17 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 import requests
+from requests.adapters import HTTPAdapter
 
 scheduler = BackgroundScheduler()
 
+# Sessão reaproveitada entre execuções (pool de conexões keep-alive)
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
 def daily_job():
     try:
         print('🕓 Executando varredura diária...')
-        requests.post('http://localhost:5000/api/process', json={'filename': 'auto'})
+        SESSION.post('http://localhost:5000/api/process', json={'filename': 'auto'}, timeout=30)
     except Exception as e:
         print(f'❌ Erro na execução automática: {e}')
 
@@ -1,26 +1,60 @@
+import mmap
 import os
-import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# =============== utilidades ===============
-
-INVALID_FN_CHARS = re.compile(r'[^A-Za-z0-9._-]')
+from utils.file_utils import ensure_outfile, linhas_mmap, linhas_mmap_reverso, sanitize_filename
 
-def sanitize_filename(name: str) -> str:
-    """Remove caracteres inválidos para nome de arquivo."""
-    s = INVALID_FN_CHARS.sub('_', name.strip())
-    return re.sub(r'_+', '_', s)
+# =============== utilidades ===============
 
-def ensure_outfile(path_dir: str, filename: str) -> str:
-    os.makedirs(path_dir, exist_ok=True)
-    filename = sanitize_filename(filename)
-    return os.path.join(path_dir, filename)
+# Tipos de registro que encerram o arquivo EEFI
+_EEFI_TRAILERS = frozenset({b"050", b"999"})
 
 def safe_slice(s: str, start: int, end: int) -> str:
     """Slice seguro para strings."""
     return s[start:end] if len(s) > start else ""
 
+def _gravar_bytes(out_path, payload, flags=os.O_WRONLY | os.O_CREAT | os.O_TRUNC):
+    """Grava o payload já montado direto no fd (sem a camada BufferedWriter do open())."""
+    fd = os.open(out_path, flags | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _write_pv(estab, blocos, topo, rodape, output_dir, sufixo, data_movimento, nsa, sep=b'\n'):
+    """Grava o arquivo de um PV com um único write.
+    topo/rodape: header e trailer já com o separador, montados uma vez para todos os PVs."""
+    nome = f"{estab}_{data_movimento}_{nsa}_{sufixo}.txt"
+    out_path = ensure_outfile(output_dir, nome)
+    _gravar_bytes(out_path, topo + sep.join(blocos) + sep + rodape)
+    return out_path
+
+def _emitir_pvs(grupos, header, trailer, output_dir, sufixo, data_movimento, nsa, sep=b'\n'):
+    """Grava os arquivos por PV em paralelo (write libera o GIL) e devolve na ordem dos grupos."""
+    # Header/trailer são iguais em todos os filhos → bytes prontos uma única vez
+    topo = header + sep if header else b''
+    rodape = trailer + sep if trailer else b''
+
+    def gravar(item):
+        return _write_pv(item[0], item[1], topo, rodape, output_dir,
+                         sufixo, data_movimento, nsa, sep)
+
+    # PVs distintos podem virar o mesmo nome após a sanitização → não gravar em paralelo
+    destinos = [sanitize_filename(f"{estab}_{data_movimento}_{nsa}_{sufixo}.txt") for estab in grupos]
+    if len(set(destinos)) == len(destinos):
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            gerados = list(ex.map(gravar, grupos.items()))
+    else:
+        # Colisão: sequencial na ordem dos grupos (o último PV grava por cima, como antes)
+        gerados = [gravar(item) for item in grupos.items()]
+    for out_path in gerados:
+        print(f"🧾 Gerado: {os.path.basename(out_path)}")
+    return gerados
+
 # =============== detecção ===============
 
 def process_file(input_path, output_dir):
@@ -60,59 +94,55 @@ def process_eevc(input_path, output_dir):
     - NSA: posições 67–73
     Nome: <estab>_<ddmmaa>_<nsa>_EEVC.txt
     """
-    with open(input_path, 'r', encoding='utf-8', errors='replace') as f:
-        lines = [l.rstrip('\n') for l in f]
-
-    if not lines:
-        print("Arquivo vazio.")
-        return []
-
     header_arquivo = None
     trailer_arquivo = None
     grupos = defaultdict(list)
     current_estab = None
+    atual = None  # lista do PV aberto (evita o lookup em grupos a cada linha)
     data_movimento = "000000"
     nsa = "000"
+    vazio = True
 
-    for line in lines:
-        tipo = line[:3]
-        if tipo == "002":
-            header_arquivo = line
-            # Data
-            raw_data = line[3:11].strip()
-            if re.fullmatch(r'\d{8}', raw_data):
-                data_movimento = raw_data[:4] + raw_data[-2:]
-            # NSA
-            nsa_raw = line[71:77].strip()
-            if re.fullmatch(r'\d{1,6}', nsa_raw):
-                nsa = nsa_raw[-3:].zfill(3)
-        elif tipo == "004":
-            pv = line[3:12].strip()
-            current_estab = pv
-            grupos[pv].append(line)
-        elif tipo == "026":
-            if current_estab:
-                grupos[current_estab].append(line)
-                current_estab = None
-        elif tipo == "028":
-            trailer_arquivo = line
-        else:
-            if current_estab:
-                grupos[current_estab].append(line)
+    # Leitura em streaming: o parsing começa no primeiro bloco lido
+    # Layout posicional ASCII: bytes do início ao fim (decode só dos campos do nome)
+    with open(input_path, 'rb', buffering=1 << 20) as f:
+        for line in f:
+            line = line.rstrip(b'\n')
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            vazio = False
+            tipo = line[:3]
+            if tipo == b"002":
+                header_arquivo = line
+                # Data
+                raw_data = line[3:11].strip()
+                if len(raw_data) == 8 and raw_data.isdigit():
+                    data_movimento = (raw_data[:4] + raw_data[-2:]).decode('ascii')
+                # NSA
+                nsa_raw = line[71:77].strip()
+                if 1 <= len(nsa_raw) <= 6 and nsa_raw.isdigit():
+                    nsa = nsa_raw[-3:].decode('ascii').zfill(3)
+            elif tipo == b"004":
+                pv = line[3:12].strip().decode('utf-8', errors='replace')
+                current_estab = pv
+                atual = grupos[pv]
+                atual.append(line)
+            elif tipo == b"026":
+                if current_estab:
+                    atual.append(line)
+                    current_estab = None
+            elif tipo == b"028":
+                trailer_arquivo = line
+            else:
+                if current_estab:
+                    atual.append(line)
 
-    gerados = []
-    for estab, blocos in grupos.items():
-        nome = f"{estab}_{data_movimento}_{nsa}_EEVC.txt"
-        out_path = ensure_outfile(output_dir, nome)
-        with open(out_path, 'w', encoding='utf-8') as f:
-            if header_arquivo:
-                f.write(header_arquivo + '\n')
-            for linha in blocos:
-                f.write(linha + '\n')
-            if trailer_arquivo:
-                f.write(trailer_arquivo + '\n')
-        gerados.append(out_path)
-        print(f"🧾 Gerado: {os.path.basename(out_path)}")
+    if vazio:
+        print("Arquivo vazio.")
+        return []
+
+    gerados = _emitir_pvs(grupos, header_arquivo, trailer_arquivo, output_dir,
+                          "EEVC", data_movimento, nsa)
 
     print(f"✅ {len(gerados)} arquivos EEVC gerados.")
     return gerados
@@ -128,49 +158,51 @@ def process_eevd(input_path, output_dir):
     - NSA: coluna 8 (numérico)
     Nome: <estab>_<ddmmaa>_<nsa>_EEVD.txt
     """
-    with open(input_path, 'r', encoding='utf-8', errors='replace') as f:
-        lines = f.readlines()
-
-    if not lines:
-        print("Arquivo vazio.")
-        return []
-
     header_arquivo = None
     trailer_arquivo = None
     grupos = defaultdict(list)
+    ultimo_pv = None
+    atual = None  # lista do último PV visto (linhas consecutivas do mesmo PV)
     data_movimento = "000000"
     nsa = "000"
+    vazio = True
 
-    for line in lines:
-        parts = [p.strip() for p in line.split(",")]
-        tipo = parts[0]
-        if tipo == "00":
-            header_arquivo = line
-            # Corrigido: data está na 2ª vírgula (coluna 2)
-            if len(parts) > 2 and re.fullmatch(r'\d{8}', parts[2]):
-                d = parts[2]
-                data_movimento = d[:4] + d[-2:]
-            if len(parts) > 7 and parts[7].isdigit():
-                nsa = parts[7][-3:].zfill(3)
-        elif tipo == "04":
-            trailer_arquivo = line
-        elif len(parts) > 1:
-            pv = parts[1]
-            grupos[pv].append(line)
+    # Leitura em streaming: o parsing começa no primeiro bloco lido
+    # Bytes do início ao fim: a linha segue crua (com a quebra) para o filho
+    with open(input_path, 'rb', buffering=1 << 20) as f:
+        for line in f:
+            vazio = False
+            if line.endswith(b'\r\n'):
+                line = line[:-2] + b'\n'
+            # Tipo pelo 1º campo; o split completo só é feito onde os campos são usados
+            i = line.find(b",")
+            tipo = (line[:i] if i >= 0 else line).strip()
+            if tipo == b"00":
+                header_arquivo = line
+                parts = line.split(b",", 8)
+                # Corrigido: data está na 2ª vírgula (coluna 2)
+                d = parts[2].strip() if len(parts) > 2 else b""
+                if len(d) == 8 and d.isdigit():
+                    data_movimento = (d[:4] + d[-2:]).decode('ascii')
+                n = parts[7].strip() if len(parts) > 7 else b""
+                if n.isdigit():
+                    nsa = n[-3:].decode('ascii').zfill(3)
+            elif tipo == b"04":
+                trailer_arquivo = line
+            elif i >= 0:
+                pv = line.split(b",", 2)[1].strip().decode('utf-8', errors='replace')
+                if pv != ultimo_pv:
+                    ultimo_pv = pv
+                    atual = grupos[pv]
+                atual.append(line)
 
-    gerados = []
-    for estab, blocos in grupos.items():
-        nome = f"{estab}_{data_movimento}_{nsa}_EEVD.txt"
-        out_path = ensure_outfile(output_dir, nome)
-        with open(out_path, 'w', encoding='utf-8') as f:
-            if header_arquivo:
-                f.write(header_arquivo)
-            for linha in blocos:
-                f.write(linha)
-            if trailer_arquivo:
-                f.write(trailer_arquivo)
-        gerados.append(out_path)
-        print(f"🧾 Gerado: {os.path.basename(out_path)}")
+    if vazio:
+        print("Arquivo vazio.")
+        return []
+
+    # Linhas já trazem a quebra original → concatenação direta (sep vazio)
+    gerados = _emitir_pvs(grupos, header_arquivo, trailer_arquivo, output_dir,
+                          "EEVD", data_movimento, nsa, sep=b'')
 
     print(f"✅ {len(gerados)} arquivos EEVD gerados.")
     return gerados
@@ -179,66 +211,147 @@ def process_eevd(input_path, output_dir):
 # ============================================
 # Parser EEFI (Financeiro)
 # ============================================
-def process_eefi(input_path, output_dir):
+def _header_eefi(line, data_movimento, nsa):
+    """Extrai data (DDMMAA) e NSA do header 030; mantém os valores atuais se inválidos."""
+    # Data
+    raw_data = line[3:11].strip()
+    if len(raw_data) == 8 and raw_data.isdigit():
+        data_movimento = (raw_data[:4] + raw_data[-2:]).decode('ascii')
+    # NSA - corrigido para pegar os 3 últimos
+    nsa_raw = line[75:81].strip()
+    if 1 <= len(nsa_raw) <= 6 and nsa_raw.isdigit():
+        nsa = nsa_raw[-3:].decode('ascii').zfill(3)
+    return data_movimento, nsa
+
+def _pv_eefi(line):
+    return line[2:11].strip().decode('utf-8', errors='replace') or "000000000"
+
+def _ultimo_trailer_eefi(mm):
+    """Último registro 050/999 do arquivo, lido de trás para frente (em geral é a última linha)."""
+    return next((l for l in linhas_mmap_reverso(mm) if l[:3] in _EEFI_TRAILERS), None)
+
+def _eefi_em_fluxo(mm, output_dir):
     """
-    EEFI (Financeiro):
-    - Header 030
-    - Detalhes 040 (por PV)
-    - Data do Movimento: posições 3–10 (DDMMAAAA)
-    - NSA: posições 66–71
-    Nome: <estab>_<ddmmaa>_<nsa>_EEFI.txt
+    Caminho streaming para EEFI ordenado por PV: o bloco de cada PV vai direto
+    para o arquivo quando o PV muda (memória de um bloco, não do arquivo todo).
+    O trailer é localizado antes pelo fim do arquivo → cada filho sai num único write.
+    Devolve None (sem deixar arquivos) se o arquivo não permitir o fluxo:
+    PV que reaparece fora de ordem, header 030 depois do 1º filho, nenhum 040.
     """
-    with open(input_path, 'r', encoding='utf-8', errors='replace') as f:
-        lines = [l.rstrip('\n') for l in f]
+    header_arquivo = None
+    trailer_arquivo = _ultimo_trailer_eefi(mm)
+    rodape = trailer_arquivo + b'\n' if trailer_arquivo else b''
+    data_movimento = "000000"
+    nsa = "000"
+    current_pv = None
+    atual = []
+    vistos = set()
+    gerados = []
+    caminhos = set()  # mesmos caminhos de gerados, para o teste de colisão em O(1)
 
-    if not lines:
-        print("Arquivo vazio.")
-        return []
+    def descarregar():
+        nome = f"{current_pv}_{data_movimento}_{nsa}_EEFI.txt"
+        out_path = ensure_outfile(output_dir, nome)
+        if out_path in caminhos:
+            return False  # PVs distintos com o mesmo nome sanitizado
+        topo = header_arquivo + b'\n' if header_arquivo else b''
+        _gravar_bytes(out_path, topo + b'\n'.join(atual) + b'\n' + rodape)
+        gerados.append(out_path)
+        caminhos.add(out_path)
+        return True
 
+    def abortar():
+        for out_path in gerados:
+            os.remove(out_path)
+        return None
+
+    for line in linhas_mmap(mm):
+        # 040 é o registro dominante → um único startswith no caminho quente
+        if line.startswith(b"040"):
+            pv = _pv_eefi(line)
+            if pv != current_pv:
+                if pv in vistos:
+                    return abortar()
+                if current_pv is not None and not descarregar():
+                    return abortar()
+                vistos.add(pv)
+                current_pv = pv
+                atual = []
+            atual.append(line)
+            continue
+        tipo = line[:3]
+        if tipo == b"030":
+            if gerados:
+                return abortar()
+            header_arquivo = line
+            data_movimento, nsa = _header_eefi(line, data_movimento, nsa)
+        elif tipo in _EEFI_TRAILERS:
+            pass  # trailer já localizado por _ultimo_trailer_eefi
+        elif current_pv:
+            atual.append(line)
+
+    if current_pv is None or not descarregar():
+        return abortar()
+    return gerados
+
+def _agrupar_eefi(mm):
+    """Caminho agrupado (qualquer ordem de PV): junta as linhas de cada PV em memória."""
     header_arquivo = None
     trailer_arquivo = None
     grupos = defaultdict(list)
     data_movimento = "000000"
     nsa = "000"
     current_pv = None
+    atual = None  # lista do PV aberto (só troca quando o PV muda)
 
-    for line in lines:
+    for line in linhas_mmap(mm):
+        # 040 é o registro dominante → um único startswith no caminho quente
+        if line.startswith(b"040"):
+            pv = _pv_eefi(line)
+            if pv != current_pv:
+                current_pv = pv
+                atual = grupos[pv]
+            atual.append(line)
+            continue
         tipo = line[:3]
-        if tipo == "030":
+        if tipo == b"030":
             header_arquivo = line
-            # Data
-            raw_data = line[3:11].strip()
-            if re.fullmatch(r'\d{8}', raw_data):
-                data_movimento = raw_data[:4] + raw_data[-2:]
-            # NSA - corrigido para pegar os 3 últimos
-            nsa_raw = line[75:81].strip()
-            if re.fullmatch(r'\d{1,6}', nsa_raw):
-                nsa = nsa_raw[-3:].zfill(3)
-        elif tipo == "040":
-            current_pv = line[2:11].strip() or "000000000"
-            grupos[current_pv].append(line)
-        elif tipo in ("050", "999"):
+            data_movimento, nsa = _header_eefi(line, data_movimento, nsa)
+        elif tipo in _EEFI_TRAILERS:
             trailer_arquivo = line
-        else:
-            if current_pv:
-                grupos[current_pv].append(line)
+        elif current_pv:
+            atual.append(line)
 
     if not grupos:
-        grupos["HEADER"] = lines
+        # Sem nenhum 040: o arquivo inteiro vai para um único filho
+        grupos["HEADER"] = list(linhas_mmap(mm))
 
-    gerados = []
-    for estab, blocos in grupos.items():
-        nome = f"{estab}_{data_movimento}_{nsa}_EEFI.txt"
-        out_path = ensure_outfile(output_dir, nome)
-        with open(out_path, 'w', encoding='utf-8') as f:
-            if header_arquivo:
-                f.write(header_arquivo + '\n')
-            for linha in blocos:
-                f.write(linha + '\n')
-            if trailer_arquivo:
-                f.write(trailer_arquivo + '\n')
-        gerados.append(out_path)
-        print(f"🧾 Gerado: {os.path.basename(out_path)}")
+    return header_arquivo, trailer_arquivo, grupos, data_movimento, nsa
+
+def process_eefi(input_path, output_dir):
+    """
+    EEFI (Financeiro):
+    - Header 030
+    - Detalhes 040 (por PV)
+    - Data do Movimento: posições 3–10 (DDMMAAAA)
+    - NSA: posições 66–71
+    Nome: <estab>_<ddmmaa>_<nsa>_EEFI.txt
+    """
+    if os.path.getsize(input_path) == 0:
+        print("Arquivo vazio.")
+        return []
+
+    # Layout posicional ASCII: varre o mmap em bytes (sem decode por linha)
+    with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Arquivo ordenado por PV (caso comum) → grava em fluxo; senão agrupa em memória
+        gerados = _eefi_em_fluxo(mm, output_dir)
+        if gerados is not None:
+            for out_path in gerados:
+                print(f"🧾 Gerado: {os.path.basename(out_path)}")
+        else:
+            header_arquivo, trailer_arquivo, grupos, data_movimento, nsa = _agrupar_eefi(mm)
+            gerados = _emitir_pvs(grupos, header_arquivo, trailer_arquivo, output_dir,
+                                  "EEFI", data_movimento, nsa)
 
     print(f"✅ {len(gerados)} arquivos EEFI gerados.")
     return gerados
@@ -18,10 +18,11 @@ def ensure_dir(path):
 def limpar_output(output_dir):
     """Remove todos os arquivos do diretório de saída antes de novo processamento."""
     ensure_dir(output_dir)
-    for fname in os.listdir(output_dir):
-        fpath = os.path.join(output_dir, fname)
-        if os.path.isfile(fpath):
-            os.remove(fpath)
+    # scandir já traz o tipo da entrada → sem stat extra por arquivo
+    with os.scandir(output_dir) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                os.unlink(entry.path)
     print(f"🧹 Limpeza realizada em {output_dir}")
 
 
@@ -1,13 +1,49 @@
 import os
 import re
 
-INVALID_FN_CHARS = re.compile(r'[^A-Za-z0-9._-]')
+VALID_FN_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._-')
+
+class _FnCharTable(dict):
+    """Tabela para str.translate: caractere inválido → '_' (memoiza cada code point visto)."""
+    def __missing__(self, c):
+        v = c if chr(c) in VALID_FN_CHARS else ord('_')
+        self[c] = v
+        return v
+
+_FN_TABLE = _FnCharTable()
+MULTI_UNDERSCORE = re.compile(r'_+')
 
 def sanitize_filename(name):
-    s = INVALID_FN_CHARS.sub('_', name.strip())
-    return re.sub(r'_+', '_', s)
+    s = name.strip().translate(_FN_TABLE)
+    return MULTI_UNDERSCORE.sub('_', s) if '__' in s else s
 
 def ensure_outfile(path_dir, filename):
     os.makedirs(path_dir, exist_ok=True)
     filename = sanitize_filename(filename)
     return os.path.join(path_dir, filename)
+
+def linhas_mmap(mm, start=0):
+    """Linhas de um arquivo mapeado (mmap), em bytes, sem o terminador (\n ou \r\n)."""
+    fim = len(mm)
+    while start < fim:
+        end = mm.find(b'\n', start)
+        if end == -1:
+            end = fim
+        linha = mm[start:end]
+        yield linha[:-1] if linha.endswith(b'\r') else linha
+        start = end + 1
+
+def linhas_mmap_reverso(mm):
+    """As mesmas linhas de linhas_mmap, da última para a primeira (trailers ficam no fim)."""
+    end = len(mm)
+    if not end:
+        return
+    if mm[end - 1:end] == b'\n':
+        end -= 1
+    while True:
+        start = mm.rfind(b'\n', 0, end) + 1
+        linha = mm[start:end]
+        yield linha[:-1] if linha.endswith(b'\r') else linha
+        if start == 0:
+            return
+        end = start - 1
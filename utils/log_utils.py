@@ -1,12 +1,59 @@
 import os
 import csv
+import atexit
+import threading
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
 LOG_PATH = os.path.join("logs", "operacoes.csv")
+LOG_FIELDS = ["data_hora", "arquivo", "tipo", "total_trailer", "total_processado", "status", "detalhe"]
+
+# Handle/writer abertos uma única vez por processo (lazy) e protegidos por lock
+_LOG_FH = None
+_LOG_WRITER = None
+_LOG_LOCK = threading.Lock()
+_ATEXIT_OK = False
+
+def _arquivo_trocado():
+    """O CSV no caminho não é mais o arquivo aberto (apagado ou rotacionado)?"""
+    try:
+        st = os.stat(LOG_PATH)
+    except FileNotFoundError:
+        return True
+    aberto = os.fstat(_LOG_FH.fileno())
+    return (st.st_dev, st.st_ino) != (aberto.st_dev, aberto.st_ino)
+
+def _get_writer():
+    global _LOG_FH, _LOG_WRITER, _ATEXIT_OK
+    if _LOG_WRITER is not None and _arquivo_trocado():
+        # Handle aponta para um inode desvinculado → reabre no caminho atual
+        _LOG_FH.close()
+        _LOG_FH = None
+        _LOG_WRITER = None
+    if _LOG_WRITER is None:
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        _LOG_FH = open(LOG_PATH, "a", newline="", encoding="utf-8", buffering=1 << 16)
+        _LOG_WRITER = csv.DictWriter(_LOG_FH, fieldnames=LOG_FIELDS)
+        if not _ATEXIT_OK:
+            atexit.register(close_log)
+            _ATEXIT_OK = True
+    return _LOG_WRITER
+
+def close_log():
+    """Fecha o handle do log CSV (chamado automaticamente na saída do processo)."""
+    global _LOG_FH, _LOG_WRITER
+    with _LOG_LOCK:
+        if _LOG_FH is not None:
+            _LOG_FH.close()
+        _LOG_FH = None
+        _LOG_WRITER = None
 
 def log_result(arquivo, tipo, total_trailer, total_processado, status, detalhe):
     """Registra resultado em CSV de logs."""
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
     nova_linha = {
         "data_hora": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
         "arquivo": arquivo,
@@ -17,9 +64,18 @@ def log_result(arquivo, tipo, total_trailer, total_processado, status, detalhe):
         "detalhe": detalhe
     }
 
-    novo = not os.path.exists(LOG_PATH)
-    with open(LOG_PATH, "a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=nova_linha.keys())
-        if novo:
-            writer.writeheader()
-        writer.writerow(nova_linha)
+    with _LOG_LOCK:
+        writer = _get_writer()
+        # Lock exclusivo no arquivo: app, agente e agendador gravam no mesmo CSV
+        if fcntl is not None:
+            fcntl.flock(_LOG_FH, fcntl.LOCK_EX)
+        try:
+            # Cabeçalho decidido já sob o lock: só um processo encontra o arquivo vazio
+            if os.fstat(_LOG_FH.fileno()).st_size == 0:
+                writer.writeheader()
+            writer.writerow(nova_linha)
+            # Flush sem fechar: o painel (/api/status) lê o mesmo CSV
+            _LOG_FH.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(_LOG_FH, fcntl.LOCK_UN)
@@ -1,10 +1,23 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+def _count_lines(path):
+    """Conta linhas em bytes, por blocos (sem decode); a última linha sem quebra também conta."""
+    total = 0
+    ultimo = b'\n'
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            total += bloco.count(b'\n')
+            ultimo = bloco[-1:]
+    return total + (ultimo != b'\n')
 
 def validate_file(original_path, generated_files):
     """Compara o total de registros originais com os separados."""
     try:
-        total_registros = sum(1 for _ in open(original_path, encoding='utf-8', errors='ignore'))
-        total_separados = sum(sum(1 for _ in open(f, encoding='utf-8', errors='ignore')) for f in generated_files)
+        total_registros = _count_lines(original_path)
+        # Contagens independentes → arquivos gerados em paralelo
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            total_separados = sum(ex.map(_count_lines, generated_files))
         is_valid = abs(total_registros - total_separados) <= len(generated_files)
         resumo = f"Registros originais: {total_registros}, separados: {total_separados}"
         return is_valid, resumo, total_registros, total_separados